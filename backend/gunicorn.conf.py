@@ -0,0 +1,18 @@
+import os
+
+# gevent workers, so the Auth0 key fetch and database queries yield
+# instead of blocking every other request in the worker
+worker_class = "gevent"
+workers = 2
+
+# one greenlet per pooled database connection (see setup_db), so requests
+# never wait on a pool checkout
+worker_connections = (
+    int(os.getenv("DB_POOL_SIZE", 10)) + int(os.getenv("DB_MAX_OVERFLOW", 20))
+)
+
+
+def post_fork(server, worker):
+    # psycopg2 is a C extension that gevent's monkey patching can't reach
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
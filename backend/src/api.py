@@ -1,16 +1,30 @@
 import os
-from flask import Flask, request, jsonify, abort
-from sqlalchemy import exc
-import json
+from flask import Flask, Response, request, abort
+from sqlalchemy import exc, insert, select
+import orjson
+import brotli
+import gzip
+import threading
+import time
 from flask_cors import CORS
+from flask_compress import Compress
 
-from .database.models import db_drop_and_create_all, setup_db, Drink, db
+from .database.models import (
+    db_drop_and_create_all, setup_db, Drink, db, drink_short, drink_long
+)
 from .auth.auth import AuthError, requires_auth
 
 app = Flask(__name__)
 setup_db(app)
 CORS(app)
 
+# brotli (falling back to gzip) for json bodies of 500 bytes or more
+app.config["COMPRESS_ALGORITHM"] = ["br", "gzip"]
+app.config["COMPRESS_MIN_SIZE"] = 500
+app.config["COMPRESS_LEVEL"] = 4
+app.config["COMPRESS_BR_LEVEL"] = 4
+Compress(app)
+
 '''
 @TODO uncomment the following line to initialize the datbase
 !! NOTE THIS WILL DROP ALL RECORDS AND START YOUR DB FROM SCRATCH
@@ -20,45 +34,176 @@ CORS(app)
 # db_drop_and_create_all()
 
 
+'''
+orjson_response(payload, status)
+    serializes the payload with orjson and wraps the bytes in a json Response
+'''
+
+
+def orjson_response(payload, status=200):
+    return Response(
+        orjson.dumps(payload), status=status, mimetype="application/json"
+    )
+
+
+'''
+orjson_request_body()
+    parses the raw request body with orjson
+    aborts with 400 if the body is not a json object
+'''
+
+
+def orjson_request_body():
+    try:
+        body = orjson.loads(request.get_data(cache=False))
+    except orjson.JSONDecodeError:
+        abort(400)
+
+    if not isinstance(body, dict):
+        abort(400)
+
+    return body
+
+
+'''
+validate_recipe(recipe)
+    aborts with 400 unless recipe is a list of items that each have
+    a color, parts and name
+'''
+
+
+def validate_recipe(recipe):
+    if not isinstance(recipe, list):
+        abort(400)
+
+    for r in recipe:
+        if not (isinstance(r, dict)
+                and r.get("color") and r.get("parts") and r.get("name")):
+            abort(400)
+
+
+'''
+stream_json_array(rows, to_dict)
+    yields the {"success": true, "drinks": [...]} body one drink at a time,
+    so the full list of dicts is never held in memory
+'''
+
+
+def stream_json_array(rows, to_dict):
+    yield b'{"success":true,"drinks":['
+    first = True
+    for r in rows:
+        yield (b"" if first else b",") + orjson.dumps(to_dict(r))
+        first = False
+    yield b"]}"
+
+
+'''
+drinks response cache
+    serialized /drinks and /drinks-detail bodies,
+    stored as (version, expires_at, bodies)
+    bodies maps a content encoding ("identity", "br", "gzip") to bytes, so
+    cache hits skip Flask-Compress instead of recompressing every request
+    a body is reused while its version matches _DRINKS_VERSION, which every
+    write endpoint bumps after committing, and for at most
+    _DRINKS_CACHE_TTL seconds, so writes made by other workers or outside
+    the api show up within that window
+    on a miss the rows are fetched in batches of 500 and serialized as they
+    arrive
+'''
+
+_DRINKS_VERSION = 0
+_DRINKS_CACHE_TTL = 5
+_DRINKS_CACHE = {"short": (None, 0.0, None), "long": (None, 0.0, None)}
+_DRINKS_CACHE_LOCK = threading.Lock()
+
+
+def compressed_bodies(body):
+    bodies = {"identity": body}
+    if len(body) >= app.config["COMPRESS_MIN_SIZE"]:
+        bodies["br"] = brotli.compress(
+            body, quality=app.config["COMPRESS_BR_LEVEL"]
+        )
+        bodies["gzip"] = gzip.compress(
+            body, compresslevel=app.config["COMPRESS_LEVEL"]
+        )
+    return bodies
+
+
+def cached_drinks_response(kind, to_dict):
+    version, expires_at, bodies = _DRINKS_CACHE[kind]
+    if version != _DRINKS_VERSION or expires_at <= time.monotonic():
+        with _DRINKS_CACHE_LOCK:
+            version, expires_at, bodies = _DRINKS_CACHE[kind]
+            if version != _DRINKS_VERSION or expires_at <= time.monotonic():
+                version = _DRINKS_VERSION
+                rows = db.session.execute(
+                    select(Drink.id, Drink.title, Drink.recipe)
+                    .execution_options(yield_per=500)
+                )
+                bodies = compressed_bodies(
+                    b"".join(stream_json_array(rows, to_dict))
+                )
+                expires_at = time.monotonic() + _DRINKS_CACHE_TTL
+                _DRINKS_CACHE[kind] = (version, expires_at, bodies)
+
+    encoding = None
+    if len(bodies) > 1:
+        encoding = request.accept_encodings.best_match(
+            app.config["COMPRESS_ALGORITHM"]
+        )
+
+    response = Response(
+        bodies[encoding or "identity"], mimetype="application/json"
+    )
+    response.vary.add("Accept-Encoding")
+    if encoding:
+        # already compressed, Flask-Compress leaves encoded responses alone
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def invalidate_drinks_cache():
+    global _DRINKS_VERSION
+    _DRINKS_VERSION += 1
+
+
 # ROUTES
 
 
 @app.route("/")
 def welcome():
-    return jsonify({"success": True, "message": "Welcome to Coffee shop api"})
+    return orjson_response({
+        "success": True,
+        "message": "Welcome to Coffee shop api"
+    })
 
 
 '''
     GET /drinks
         - public endpoint
         - contains only the drink.short() data representation
+        - selects the columns directly, skipping Drink instances
 '''
 
 
 @app.route("/drinks")
 def get_drinks():
-    drinks = Drink.query.all()
-    return jsonify({
-        "success": True,
-        "drinks": [drink.short() for drink in drinks]
-    })
+    return cached_drinks_response("short", drink_short)
 
 
 '''
     GET /drinks-detail
         - requires the permission 'get:drinks-detail'
         - contains the drink.long() data representation
+        - selects the columns directly, skipping Drink instances
 '''
 
 
 @app.route("/drinks-detail")
 @requires_auth("get:drinks-detail")
 def get_drinks_details(payload):
-    drinks = Drink.query.all()
-    return jsonify({
-        "success": True,
-        "drinks": [drink.long() for drink in drinks]
-    })
+    return cached_drinks_response("long", drink_long)
 
 
 '''
@@ -72,48 +217,53 @@ def get_drinks_details(payload):
 @app.route("/drinks", methods=["POST"])
 @requires_auth("post:drinks")
 def create_drink(payload):
-    body = request.get_json()
+    body = orjson_request_body()
     title = body.get("title", None)
     recipe = body.get("recipe", None)
 
     if not title or not recipe:
         abort(400)
 
-    for item in recipe:
-        color = item.get("color", None)
-        parts = item.get("parts", None)
-        name = item.get("name", None)
-        if not color or not parts or not name:
-            abort(400)
+    validate_recipe(recipe)
 
-    drink = Drink.query.filter_by(title=title).first()
-    if drink:
+    # the unique index on title rejects duplicates, no pre-check needed;
+    # RETURNING builds the response without loading a Drink instance
+    try:
+        row = db.session.execute(
+            insert(Drink)
+            .values(title=title, recipe=recipe)
+            .returning(Drink.id, Drink.title, Drink.recipe)
+        ).one()
+        db.session.commit()
+    except exc.IntegrityError:
+        db.session.rollback()
         abort(409)
+    invalidate_drinks_cache()
 
-    drink = Drink(title=title, recipe=json.dumps(recipe))
-    drink.insert()
-
-    return jsonify({"success": True, "drinks": [drink.long()]})
+    return orjson_response({
+        "success": True,
+        "drinks": [drink_long(row)]
+    })
 
 
 '''
     PATCH /drinks/<id>
         - Update and existing drink
-        - Requires the drink id
+        - Requires the drink id (non-integer ids 404 at routing time)
         - requires the permission 'patch:drinks'
         - contains the drink.long() data representation
 '''
 
 
-@app.route("/drinks/<id>", methods=["PATCH"])
+@app.route("/drinks/<int:id>", methods=["PATCH"])
 @requires_auth("patch:drinks")
 def update_drink(payload, id):
-    drink = Drink.query.get(id)
+    drink = db.session.get(Drink, id)
 
     if not drink:
         abort(404)
 
-    body = request.get_json()
+    body = orjson_request_body()
     title = body.get("title", None)
     recipe = body.get("recipe", None)
 
@@ -121,14 +271,8 @@ def update_drink(payload, id):
         drink.title = title
 
     if recipe:
-        for item in recipe:
-            color = item.get("color", None)
-            parts = item.get("parts", None)
-            name = item.get("name", None)
-            if not color or not parts or not name:
-                abort(400)
-
-        drink.recipe = json.dumps(recipe)
+        validate_recipe(recipe)
+        drink.recipe = recipe
 
     try:
         drink.update()
@@ -136,7 +280,9 @@ def update_drink(payload, id):
         db.session.rollback()
         abort(500)
 
-    return jsonify({
+    invalidate_drinks_cache()
+
+    return orjson_response({
         "success": True,
         "drinks": [drink.long()]
     })
@@ -145,15 +291,15 @@ def update_drink(payload, id):
 '''
     DELETE /drinks/<id>
         - Delete existing drink
-        - Requires the drink id
+        - Requires the drink id (non-integer ids 404 at routing time)
         - requires the permission 'delete:drinks'
 '''
 
 
-@app.route("/drinks/<id>", methods=["DELETE"])
+@app.route("/drinks/<int:id>", methods=["DELETE"])
 @requires_auth("delete:drinks")
 def delete_drink(payload, id):
-    drink = Drink.query.get(id)
+    drink = db.session.get(Drink, id)
 
     if not drink:
         abort(404)
@@ -164,60 +310,70 @@ def delete_drink(payload, id):
         db.session.rollback()
         abort(500)
 
-    return jsonify({"success": True, "delete": id})
+    invalidate_drinks_cache()
+
+    return orjson_response({"success": True, "delete": id})
 
 
 # Error Handling
 
+# constant error bodies, serialized once at import
+_ERR_400 = orjson.dumps({
+    "success": False,
+    "error": 400,
+    "message": "Bad request."
+})
+_ERR_404 = orjson.dumps({
+    "success": False,
+    "error": 404,
+    "message": "Resource not found."
+})
+_ERR_409 = orjson.dumps({
+    "success": False,
+    "error": 409,
+    "message": "A conflict was found."
+})
+_ERR_422 = orjson.dumps({
+    "success": False,
+    "error": 422,
+    "message": "Unprocessable."
+})
+_ERR_500 = orjson.dumps({
+    "success": False,
+    "error": 500,
+    "message": "Internal Server Error."
+})
+
+
 @app.errorhandler(400)
 def bad_request(error):
-    return jsonify({
-        "success": False,
-        "error": 400,
-        "message": "Bad request."
-    }), 400
+    return Response(_ERR_400, status=400, mimetype="application/json")
 
 
 @app.errorhandler(404)
 def not_found(error):
-    return jsonify({
-        "success": False,
-        "error": 404,
-        "message": "Resource not found."
-    })
+    return Response(_ERR_404, status=404, mimetype="application/json")
 
 
 @app.errorhandler(409)
 def conflict(error):
-    return jsonify({
-        "success": False,
-        "error": 409,
-        "message": "A conflict was found."
-    }), 409
+    return Response(_ERR_409, status=409, mimetype="application/json")
 
 
 @app.errorhandler(422)
 def unprocessable(error):
-    return jsonify({
-        "success": False,
-        "error": 422,
-        "message": "Unprocessable."
-    }), 422
+    return Response(_ERR_422, status=422, mimetype="application/json")
 
 
 @app.errorhandler(500)
 def internal_server_error(error):
-    return jsonify({
-        "success": False,
-        "error": 500,
-        "message": "Internal Server Error."
-    }), 500
+    return Response(_ERR_500, status=500, mimetype="application/json")
 
 
 @app.errorhandler(AuthError)
 def auth_error(error):
-    return jsonify({
+    return orjson_response({
         "success": False,
         "error": error.status_code,
         "message": error.error["description"]
-    }), error.status_code
+    }, error.status_code)
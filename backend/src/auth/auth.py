@@ -1,10 +1,11 @@
 from dotenv import load_dotenv
 import os
-import json
-from flask import request, _request_ctx_stack
+import threading
+import time
+import orjson
+from collections import OrderedDict
+from flask import request
 from functools import wraps
-from jose import jwt
-from urllib.request import urlopen
 
 load_dotenv()
 
@@ -12,6 +13,19 @@ AUTH0_DOMAIN = os.getenv("AUTH0_DOMAIN")
 ALGORITHMS = [os.getenv("ALGORITHM")]
 API_AUDIENCE = os.getenv("API_AUDIENCE")
 
+# Auth0 signing keys as prebuilt jose keys, indexed by key id (kid)
+_JWKS_CACHE = {"keys_by_kid": {}, "fetched_at": 0.0}
+_JWKS_TTL = 3600
+# floor between forced refetches so unknown kids can't hammer Auth0
+_JWKS_MIN_REFRESH = 60
+
+# verified payloads keyed by raw token, oldest first
+_TOKEN_CACHE = OrderedDict()
+_TOKEN_CACHE_MAXSIZE = 1024
+_TOKEN_CACHE_LOCK = threading.Lock()
+# treat tokens this close to expiry as expired
+_TOKEN_EXP_LEEWAY = 5
+
 # AuthError Exception
 
 
@@ -49,27 +63,29 @@ def get_token_auth_header():
             "description": "Authorization header missing."
         }, 401)
 
-    parts = auth_header.split()
+    # tabs count as separators too, like the str.split() this replaced
+    scheme, _, token = auth_header.replace("\t", " ").partition(" ")
 
-    if parts[0].lower() != "bearer":
+    if scheme.lower() != "bearer":
         raise AuthError({
             "code": "invalid_header",
             "description": "Authorization header must start with 'Bearer'"
         }, 401)
 
-    if len(parts) == 1:
+    token = token.strip()
+
+    if not token:
         raise AuthError({
             "code": "invalid_header",
             "description": "Token not found."
         }, 401)
 
-    if len(parts) > 2:
+    if " " in token:
         raise AuthError({
             "code": "invalid_header",
             "description": "Authorization header must be 'Bearer token'"
         }, 401)
 
-    token = parts[1]
     return token
 
 
@@ -103,14 +119,54 @@ def check_permissions(permission, payload):
     return True
 
 
+'''
+_get_jwks(force) method
+    @INPUTS
+        force: refetch the keys even if the cache is still fresh
+               (at most once per _JWKS_MIN_REFRESH seconds)
+    - fetches Auth0 /.well-known/jwks.json at most once per _JWKS_TTL seconds
+    - builds each rsa key once so jwt.decode skips re-parsing the jwk
+    return a dict mapping each key id (kid) to its jose key
+'''
+
+
+def _get_jwks(force=False):
+    """ Return the cached Auth0 signing keys, refreshing them when stale """
+
+    age = time.time() - _JWKS_CACHE["fetched_at"]
+
+    if age > _JWKS_TTL or (force and age > _JWKS_MIN_REFRESH):
+        # imported lazily, only needed on the rare refresh
+        from jose import jwk
+        from urllib.request import urlopen
+
+        json_url = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+        jwks = orjson.loads(json_url.read())
+        _JWKS_CACHE["keys_by_kid"] = {
+            key["kid"]: jwk.construct({
+                "kty": key["kty"],
+                "kid": key["kid"],
+                "use": key["use"],
+                "n": key["n"],
+                "e": key["e"]
+            }, ALGORITHMS[0])
+            for key in jwks["keys"]
+        }
+        _JWKS_CACHE["fetched_at"] = time.time()
+
+    return _JWKS_CACHE["keys_by_kid"]
+
+
 '''
 verify_decode_jwt(token) method
     @INPUTS
         token: a json web token (string)
     - ensures token is an Auth0 token with key id (kid)
-    - verifies the token using Auth0 /.well-known/jwks.json
+    - verifies the token using the cached Auth0 /.well-known/jwks.json
+      (refetched once if the kid is unknown, e.g. after a key rotation)
     - decodes the payload from the token
     - validates the claims
+    - converts the permissions claim to a frozenset
     return the decoded payload
     !!NOTE urlopen has a common certificate error described here: https://stackoverflow.com/questions/50236117/scraping-ssl-certificate-verify-failed-error-for-http-en-wikipedia-org
 '''
@@ -119,10 +175,10 @@ verify_decode_jwt(token) method
 def verify_and_decode_jwt(token):
     """ Verify if token is valid and return payload """
 
-    json_url = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(json_url.read())
+    # imported lazily, only reached on a token cache miss
+    from jose import jwt
+
     unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
 
     if 'kid' not in unverified_header:
         raise AuthError({
@@ -130,15 +186,8 @@ def verify_and_decode_jwt(token):
             "description": "Authorization malformed."
         }, 401)
 
-    for key in jwks["keys"]:
-        if unverified_header["kid"] == key["kid"]:
-            rsa_key = {
-                "kty": key["kty"],
-                "kid": key["kid"],
-                "use": key["use"],
-                "n": key["n"],
-                "e": key["e"]
-            }
+    kid = unverified_header["kid"]
+    rsa_key = _get_jwks().get(kid) or _get_jwks(force=True).get(kid)
 
     if rsa_key:
         try:
@@ -149,6 +198,9 @@ def verify_and_decode_jwt(token):
                 audience=API_AUDIENCE,
                 issuer=f"https://{AUTH0_DOMAIN}/"
             )
+            # frozenset once per token so permission checks are O(1)
+            if "permissions" in payload:
+                payload["permissions"] = frozenset(payload["permissions"])
             return payload
 
         except jwt.ExpiredSignatureError:
@@ -174,6 +226,28 @@ def verify_and_decode_jwt(token):
     }, 400)
 
 
+'''
+_cache_payload(token, payload) method
+    - keeps up to _TOKEN_CACHE_MAXSIZE verified payloads, keyed by token
+    - requires_auth only reuses a payload while its exp claim is in the future
+    - the least recently used token is evicted once the cache is full
+'''
+
+
+def _cache_payload(token, payload):
+    """ Remember a verified payload until its token expires """
+
+    exp = payload.get("exp")
+    if not isinstance(exp, (int, float)):
+        return
+
+    with _TOKEN_CACHE_LOCK:
+        _TOKEN_CACHE[token] = {"payload": payload, "exp": exp}
+        _TOKEN_CACHE.move_to_end(token)
+        while len(_TOKEN_CACHE) > _TOKEN_CACHE_MAXSIZE:
+            _TOKEN_CACHE.popitem(last=False)
+
+
 '''
 @requires_auth(permission) decorator method
     @INPUTS
@@ -184,11 +258,30 @@ def verify_and_decode_jwt(token):
 
 def requires_auth(permission=""):
     def requires_auth_decorator(f):
+        # bound once per view so the per-request path skips global lookups
+        cache_get = _TOKEN_CACHE.get
+        cache_touch = _TOKEN_CACHE.move_to_end
+        now = time.time
+        leeway = _TOKEN_EXP_LEEWAY
+
         @wraps(f)
         def wrapper(*args, **kwargs):
             token = get_token_auth_header()
-            payload = verify_and_decode_jwt(token)
-            check_permissions(permission, payload)
+            cached = cache_get(token)
+            if cached is not None and cached["exp"] > now() + leeway:
+                try:
+                    cache_touch(token)
+                except KeyError:
+                    # evicted by another request since cache_get, still valid
+                    pass
+                payload = cached["payload"]
+            else:
+                payload = verify_and_decode_jwt(token)
+                _cache_payload(token, payload)
+
+            permissions = payload.get("permissions")
+            if permissions is None or permission not in permissions:
+                check_permissions(permission, payload)
 
             return f(payload, *args, **kwargs)
         return wrapper
@@ -1,8 +1,9 @@
 from dotenv import load_dotenv
 import os
-from sqlalchemy import Column, String, Integer
+from sqlalchemy import Column, String, Integer, JSON
 from flask_sqlalchemy import SQLAlchemy
 import json
+from operator import attrgetter
 
 load_dotenv()
 
@@ -10,6 +11,9 @@ DB_HOST = os.getenv("DB_HOST")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_NAME = os.getenv("DB_NAME")
+# gunicorn.conf.py sizes gevent worker connections to pool size + overflow
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
 
 database_path = "postgresql+psycopg2://{}:{}@{}/{}".format(
     DB_USER, DB_PASSWORD, DB_HOST, DB_NAME
@@ -20,12 +24,19 @@ db = SQLAlchemy()
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
+    configures a connection pool so concurrent requests each get a connection
 '''
 
 
 def setup_db(app):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_pre_ping": True,
+        "pool_recycle": 300
+    }
     db.app = app
     db.init_app(app)
 
@@ -44,13 +55,37 @@ def db_drop_and_create_all():
     # add one demo row which is helping in POSTMAN test
     drink = Drink(
         title='water',
-        recipe='[{"name": "water", "color": "blue", "parts": 1}]'
+        recipe=[{"name": "water", "color": "blue", "parts": 1}]
     )
 
     drink.insert()
 # ROUTES
 
 
+'''
+drink_short(row) / drink_long(row)
+    short and long drink representations, built from any object with
+    id, title and recipe attributes (selected rows or Drink instances)
+    Drink.short() and Drink.long() delegate here
+'''
+
+_drink_fields = attrgetter("id", "title", "recipe")
+
+
+def drink_short(row):
+    i, t, r = _drink_fields(row)
+    return {
+        "id": i,
+        "title": t,
+        "recipe": [{"color": p["color"], "parts": p["parts"]} for p in r]
+    }
+
+
+def drink_long(row):
+    i, t, r = _drink_fields(row)
+    return {"id": i, "title": t, "recipe": r}
+
+
 '''
 Drink
 a persistent drink entity, extends the base SQLAlchemy Model
@@ -60,11 +95,11 @@ a persistent drink entity, extends the base SQLAlchemy Model
 class Drink(db.Model):
     # Autoincrementing, unique primary key
     id = Column(Integer().with_variant(Integer, "sqlite"), primary_key=True)
-    # String Title
+    # String Title, unique so the database indexes it and rejects duplicates
     title = Column(String(80), unique=True)
-    # the ingredients blob - this stores a lazy json blob
+    # the ingredients - a json column, (de)serialized by the database driver
     # the required datatype is [{'color': string, 'name':string, 'parts':number}]
-    recipe = Column(String(180), nullable=False)
+    recipe = Column(JSON, nullable=False)
 
     '''
     short()
@@ -72,14 +107,7 @@ class Drink(db.Model):
     '''
 
     def short(self):
-        print(json.loads(self.recipe))
-        short_recipe = [{'color': r['color'], 'parts': r['parts']}
-                        for r in json.loads(self.recipe)]
-        return {
-            'id': self.id,
-            'title': self.title,
-            'recipe': short_recipe
-        }
+        return drink_short(self)
 
     '''
     long()
@@ -87,11 +115,7 @@ class Drink(db.Model):
     '''
 
     def long(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'recipe': json.loads(self.recipe)
-        }
+        return drink_long(self)
 
     '''
     insert()